@@ -6,11 +6,18 @@ try:
 except ImportError:
     from backports.functools_lru_cache import lru_cache
 
+import copy
+import hashlib
+import itertools
+import json
 import logging
+import mmap
 import re
 import os
+import tempfile
 
 from c7n.exceptions import PolicyValidationError
+from c7n.executor import ProcessPoolExecutor
 from c7n.policy import PolicyCollection
 from c7n.resources import load_resources
 try:
@@ -18,36 +25,72 @@ try:
 except ImportError:
     # serverless execution doesn't use jsonschema
     schema = None
-from c7n.structure import StructureParser
+try:
+    # optional code generating validator, used as a fast path
+    # for policies that pass validation.
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+from c7n.structure import AWS_PREFIX, StructureParser
 from c7n.utils import load_file
+from c7n.version import version
+
+log = logging.getLogger('custodian.loader')
+
+# structure parsing is stateless, share one
+# instance across loaders and validators.
+_DEFAULT_STRUCTURE = StructureParser()
 
 
 class SchemaValidator:
 
+    # opt-in, compiling the schema to code has a fixed startup cost
+    # that only pays off when validating many policies.
+    fast_validate = bool(fastjsonschema) and os.environ.get(
+        'C7N_FAST_SCHEMA', 'no') == 'yes'
+
+    # persist generated schemas across invocations, keyed on custodian
+    # version and resource types. opt-in as plugins and development
+    # checkouts can change the schema without a version change.
+    schema_cache = os.environ.get('C7N_SCHEMA_CACHE', 'no') == 'yes'
+    schema_cache_dir = os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'c7n', 'schemas')
+
     def __init__(self):
         # mostly useful for interactive debugging
         self.schema = None
         self.validator = None
+        self.fast_validator = None
 
     def validate(self, policy_data, resource_types=None):
         # before calling validate, gen_schema needs to be invoked
-        # with the qualified resource types in policy_data.
+        # with the qualified resource types in policy_data. callers
+        # passing resource types should use a sorted tuple, which is
+        # used as the schema cache key as is.
         if resource_types is None:
-            resource_types = StructureParser().get_resource_types(policy_data)
-        self.gen_schema(tuple(sorted(resource_types)))
+            resource_types = _DEFAULT_STRUCTURE.get_resource_types(policy_data)
+        if not isinstance(resource_types, tuple):
+            resource_types = tuple(sorted(resource_types))
+        self.gen_schema(resource_types)
         errors = self._validate(policy_data)
         return errors or []
 
     def _validate(self, policy_data):
-        errors = list(self.validator.iter_errors(policy_data))
-        if not errors:
+        if self.fast_validator is not None and self._fast_validate(policy_data):
+            return schema.check_unique(policy_data) or []
+
+        # only the first error is needed unless we fall back to best_match.
+        errors = self.validator.iter_errors(policy_data)
+        error = next(errors, None)
+        if error is None:
             return schema.check_unique(policy_data) or []
         try:
             resp = schema.policy_error_scope(
-                schema.specific_error(errors[0]), policy_data)
+                schema.specific_error(error), policy_data)
             name = isinstance(
-                errors[0].instance,
-                dict) and errors[0].instance.get(
+                error.instance,
+                dict) and error.instance.get(
                     'name',
                     'unknown') or 'unknown'
             return [resp, name]
@@ -56,23 +99,110 @@ class SchemaValidator:
                 "schema-validator: specific_error failed, traceback, followed by fallback")
 
         return list(filter(None, [
-            errors[0],
-            schema.best_match(self.validator.iter_errors(policy_data)),
+            error,
+            schema.best_match(itertools.chain([error], errors)),
         ]))
 
+    def _fast_validate(self, policy_data):
+        # on failure we use the interpreted validator for a detailed error.
+        file_validator, policy_validator = self.fast_validator
+        try:
+            file_validator(policy_data)
+            for p in policy_data['policies']:
+                policy_validator(p)
+        except fastjsonschema.JsonSchemaException:
+            return False
+        return True
+
     def gen_schema(self, resource_types):
-        self.validator = v = self._gen_schema(resource_types)
+        cache_dir = self.schema_cache and self.schema_cache_dir or None
+        self.validator = v = _gen_schema(resource_types, cache_dir)
         # alias for debugging
         self.schema = v.schema
+        if self.fast_validate:
+            self.fast_validator = _gen_fast_schema(resource_types, cache_dir)
         return self.validator
 
-    @lru_cache(maxsize=32)
-    def _gen_schema(self, resource_types):
-        if schema is None:
-            raise RuntimeError("missing jsonschema dependency")
+
+# schema generation is cached per process rather than per validator
+# instance, so multiple loaders share the generated schemas.
+
+@lru_cache(maxsize=32)
+def _gen_schema(resource_types, cache_dir=None):
+    if schema is None:
+        raise RuntimeError("missing jsonschema dependency")
+    rt_schema = cache_dir and _load_cached_schema(cache_dir, resource_types)
+    if not rt_schema:
         rt_schema = schema.generate(resource_types)
         schema.JsonSchemaValidator.check_schema(rt_schema)
-        return schema.JsonSchemaValidator(rt_schema)
+        if cache_dir:
+            _save_cached_schema(cache_dir, resource_types, rt_schema)
+    return schema.JsonSchemaValidator(rt_schema)
+
+
+def _schema_cache_path(cache_dir, resource_types):
+    key = hashlib.blake2b(
+        '|'.join((version,) + tuple(resource_types)).encode('utf8'),
+        digest_size=20).hexdigest()
+    return os.path.join(cache_dir, key + '.json')
+
+
+def _load_cached_schema(cache_dir, resource_types):
+    path = _schema_cache_path(cache_dir, resource_types)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        log.warning("schema-validator: ignoring invalid schema cache %s", path)
+
+
+def _save_cached_schema(cache_dir, resource_types, rt_schema):
+    path = _schema_cache_path(cache_dir, resource_types)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write and rename, so concurrent readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    except OSError:
+        log.warning("schema-validator: unable to write schema cache %s", path)
+        return
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(rt_schema, fh)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        # caching is best effort, validation uses the in memory schema.
+        log.warning("schema-validator: unable to write schema cache %s", path)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+@lru_cache(maxsize=32)
+def _gen_fast_schema(resource_types, cache_dir=None):
+    """Compile validators for the file structure and for a single policy.
+
+    Policies are validated one at a time against the policy schema,
+    so each call only walks the resource alternatives for one policy.
+    """
+    # fastjsonschema annotates the schema in place, and the generated
+    # schema shares structure with filter and action classes.
+    rt_schema = copy.deepcopy(_gen_schema(resource_types, cache_dir).schema)
+    policies_schema = rt_schema['properties']['policies']
+    policy_schema = dict(policies_schema.pop('items'))
+    # references are resolved against the root document.
+    policy_schema['$schema'] = rt_schema['$schema']
+    policy_schema['definitions'] = rt_schema['definitions']
+    file_schema = {k: v for k, v in rt_schema.items() if k != 'definitions'}
+    try:
+        return (fastjsonschema.compile(file_schema),
+                fastjsonschema.compile(policy_schema))
+    except fastjsonschema.JsonSchemaDefinitionException:
+        log.debug(
+            "schema-validator: unable to compile fast validator for %s",
+            ", ".join(resource_types))
 
 
 class PolicyLoader:
@@ -84,7 +214,7 @@ class PolicyLoader:
     def __init__(self, config):
         self.policy_config = config
         self.validator = SchemaValidator()
-        self.structure = StructureParser()
+        self.structure = _DEFAULT_STRUCTURE
         self.seen_types = set()
 
     def load_file(self, file_path, format=None):
@@ -97,38 +227,39 @@ class PolicyLoader:
     def _handle_missing_resources(self, policy_data, missing):
         # for an invalid resource type catch and try to associate
         # it to the policy by name.
+        missing = frozenset(missing)
         for p in policy_data.get('policies', ()):
             pr = p['resource']
             if '.' not in pr:
-                pr = "aws.%s" % pr
+                pr = AWS_PREFIX + pr
             if pr in missing:
                 raise PolicyValidationError(
                     "Policy:%s references an unknown resource:%s" % (
                         p['name'], p['resource']))
 
+    def load_files(self, file_paths, format=None, max_workers=None):
+        """Load a set of policy files, yielding a collection per file.
+
+        Files are parsed and schema validated in a process pool, each
+        worker generates the schema for a set of resource types at most
+        once (or loads it from the on-disk schema cache). Collections are
+        assembled in the calling process, in file order.
+        """
+        file_paths = list(file_paths)
+        params = [
+            (self.__class__, self.policy_config, fp, format) for fp in file_paths]
+        with ProcessPoolExecutor(max_workers=max_workers) as w:
+            for file_path, policy_data in zip(
+                    file_paths, w.map(_load_policy_data, params)):
+                yield self.load_data(policy_data, file_path, validate=False)
+
     def load_data(self, policy_data, file_uri, validate=None,
                   session_factory=None, config=None):
-        self.structure.validate(policy_data)
+        self.validate_data(policy_data, validate)
 
         # Use passed in policy exec configuration or default on loader
         config = config or self.policy_config
 
-        # track policy resource types and only load if needed.
-        rtypes = set(self.structure.get_resource_types(policy_data))
-
-        missing = load_resources(list(rtypes))
-        if missing:
-            self._handle_missing_resources(policy_data, missing)
-
-        if schema and (validate is not False or (
-                validate is None and
-                self.default_schema_validate)):
-            errors = self.validator.validate(policy_data, tuple(rtypes))
-            if errors:
-                raise PolicyValidationError(
-                    "Failed to validate policy %s\n %s\n" % (
-                        errors[1], errors[0]))
-
         collection = self.collection_class.from_data(
             policy_data, config, session_factory)
 
@@ -143,6 +274,62 @@ class PolicyLoader:
         # [p.validate() for p in collection]
         return collection
 
+    def validate_data(self, policy_data, validate=None):
+        self.structure.validate(policy_data)
+
+        # track policy resource types and only load if needed.
+        rtypes = set(self.structure.get_resource_types(policy_data))
+
+        new_types = rtypes.difference(self.seen_types)
+        if new_types:
+            missing = load_resources(list(new_types))
+            if missing:
+                self._handle_missing_resources(policy_data, missing)
+            self.seen_types.update(new_types.difference(missing))
+
+        if schema and (validate is not False or (
+                validate is None and
+                self.default_schema_validate)):
+            errors = self.validator.validate(policy_data, tuple(sorted(rtypes)))
+            if errors:
+                raise PolicyValidationError(
+                    "Failed to validate policy %s\n %s\n" % (
+                        errors[1], errors[0]))
+
+
+def _load_policy_data(params):
+    # process pool worker for PolicyLoader.load_files, policy collections
+    # aren't picklable so we return the validated policy data.
+    loader_class, config, file_path, format = params
+    if not os.path.exists(file_path):
+        raise IOError("Invalid path for config %r" % file_path)
+    policy_data = load_file(file_path, format=format)
+    loader_class(config).validate_data(policy_data)
+    return policy_data
+
+
+# match policy name declarations, anchored per line so we can scan
+# the whole file buffer in one pass.
+POLICY_NAME_PATTERN = re.compile(
+    rb'^[ \t]+(?:-[ \t]+)?name: ([\w-]+)[ \t]*\r?$', re.MULTILINE)
+
+
+def scan_policy_names(filename):
+    """Return a mapping of policy name to line number for a yaml file."""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            # keep a running newline count from the last match, so line
+            # numbering is a single pass over the buffer.
+            policies = {}
+            line, pos = 1, 0
+            for m in POLICY_NAME_PATTERN.finditer(buf):
+                line += buf[pos:m.start()].count(b'\n')
+                pos = m.start()
+                policies[m.group(1).decode('utf8')] = line
+            return policies
+
 
 class SourceLocator:
     def __init__(self, filename):
@@ -160,10 +347,29 @@ class SourceLocator:
         return f"{filename}:{line}"
 
     def load_file(self):
+        self.policies = scan_policy_names(self.filename)
+
+
+class SourceIndex:
+    """Source locations for policies across a set of yaml files."""
+
+    def __init__(self, filenames):
+        self.filenames = list(filenames)
+        self.policies = None
+
+    def find(self, name):
+        """Find returns the file and line number for the policy."""
+        if self.policies is None:
+            self.load_files()
+        location = self.policies.get(name, None)
+        if location is None:
+            return ""
+        filename, line = location
+        return f"{os.path.basename(filename)}:{line}"
+
+    def load_files(self):
         self.policies = {}
-        r = re.compile(r'^\s+(-\s+)?name: ([\w-]+)\s*$')
-        with open(self.filename) as f:
-            for i, line in enumerate(f, 1):
-                m = r.search(line)
-                if m:
-                    self.policies[m.group(2)] = i
+        for filename in self.filenames:
+            for name, line in scan_policy_names(filename).items():
+                # first declaration wins, matching policy load order.
+                self.policies.setdefault(name, (filename, line))
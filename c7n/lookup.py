@@ -1,46 +1,65 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
 
+from functools import lru_cache
+
 import jmespath
-import copy
 
 
-class Lookup:
-    RESOURCE_SOURCE = 'resource'
+@lru_cache(maxsize=512)
+def _compile(key):
+    return jmespath.compile(key)
+
+
+RESOURCE_SOURCE = 'resource'
 
-    schema = {
+
+def _lookup_schema(default_schema=None):
+    # builds a fresh schema per call, so callers can embed it without
+    # sharing (or deep copying) nested dicts.
+    properties = {
+        'type': {'type': 'string', 'enum': [RESOURCE_SOURCE]},
+        'key': {'type': 'string'}
+    }
+    if default_schema is not None:
+        properties['default-value'] = default_schema
+    return {
         'type': 'object',
         'oneOf': [
             {
-                'properties': {
-                    'type': {'type': 'string', 'enum': [RESOURCE_SOURCE]},
-                    'key': {'type': 'string'}
-                },
+                'properties': properties,
                 'additionalProperties': False,
                 'required': ['type', 'key']
             }
         ]
     }
 
+
+class Lookup:
+    RESOURCE_SOURCE = RESOURCE_SOURCE
+
+    schema = _lookup_schema()
+
     @staticmethod
     def lookup_type(schema):
-        lookup_schema = copy.deepcopy(Lookup.schema)
-        for lookup in lookup_schema['oneOf']:
-            lookup['properties']['default-value'] = schema
-
         return {
             'oneOf': [
-                lookup_schema,
+                _lookup_schema(schema),
                 schema
             ]
         }
 
     @staticmethod
     def extract(source, data=None):
-        if Lookup.is_lookup(source):
-            return Lookup.get_value(source, data)
-        else:
+        # inlined is_lookup/get_value, as this is evaluated per resource.
+        if type(source) is not dict or source.get('type') != Lookup.RESOURCE_SOURCE:
             return source
+        value = _compile(source['key']).search(data)
+        if value is not None:
+            return value
+        if 'default-value' not in source:
+            raise Exception('Lookup for key, {}, returned None'.format(source['key']))
+        return source['default-value']
 
     @staticmethod
     def is_lookup(source):
@@ -53,7 +72,7 @@ class Lookup:
 
     @staticmethod
     def get_value_from_resource(source, resource):
-        value = jmespath.search(source['key'], resource)
+        value = _compile(source['key']).search(resource)
 
         if value is not None:
             return value
@@ -2,9 +2,15 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import json
+from sys import intern
 
 from c7n.exceptions import PolicyValidationError
 
+# provider prefix for unqualified resource types.
+AWS_PREFIX = 'aws.'
+# allowed types for individual filter and action entries.
+ELEMENT_TYPES = (dict, str)
+
 
 class StructureParser:
     """Provide fast validation and inspection of a policy file.
@@ -12,14 +18,14 @@ class StructureParser:
     Intent is to provide more humane validation for top level errors
     instead of printing full schema as error message.
     """
-    allowed_file_keys = {'vars', 'policies'}
-    required_policy_keys = {'name', 'resource'}
-    allowed_policy_keys = {'name', 'resource', 'title', 'description', 'mode',
+    allowed_file_keys = frozenset({'vars', 'policies'})
+    required_policy_keys = frozenset({'name', 'resource'})
+    allowed_policy_keys = frozenset({'name', 'resource', 'title', 'description', 'mode',
          'tags', 'max-resources', 'metadata', 'query',
          'filters', 'actions', 'source', 'conditions',
          # legacy keys subject to deprecation.
          'region', 'start', 'end', 'tz', 'max-resources-percent',
-         'comments', 'comment'}
+         'comments', 'comment'})
 
     def validate(self, data):
         if not isinstance(data, dict):
@@ -27,9 +33,7 @@ class StructureParser:
                 "Policy file top level data structure "
                 "should be a mapping/dict, instead found:%s") % (
                     type(data).__name__))
-        dkeys = set(data.keys())
-
-        extra = dkeys.difference(self.allowed_file_keys)
+        extra = [k for k in data if k not in self.allowed_file_keys]
         if extra:
             raise PolicyValidationError((
                 'Policy files top level keys are %s, found extra: %s' % (
@@ -44,48 +48,49 @@ class StructureParser:
             raise PolicyValidationError((
                 '`policies` key should be an array/list found: %s' % (
                     type(pdata).__name__)))
+        validate_policy = self.validate_policy
         for p in pdata:
-            self.validate_policy(p)
+            validate_policy(p)
 
     def validate_policy(self, p):
         if not isinstance(p, dict):
             raise PolicyValidationError((
                 'policy must be a dictionary/mapping found:%s policy:\n %s' % (
                     type(p).__name__, json.dumps(p, indent=2))))
-        pkeys = set(p)
-        if self.required_policy_keys.difference(pkeys):
+        if not p.keys() >= self.required_policy_keys:
             raise PolicyValidationError(
                 'policy missing required keys (name, resource) data:\n %s' % (
                     json.dumps(p, indent=2)))
-        if pkeys.difference(self.allowed_policy_keys):
+        extra = [k for k in p if k not in self.allowed_policy_keys]
+        if extra:
             raise PolicyValidationError(
                 'policy:%s has unknown keys: %s' % (
-                    p['name'], ','.join(pkeys.difference(self.allowed_policy_keys))))
-        if not isinstance(p.get('filters', []), (list, type(None))):
+                    p['name'], ','.join(extra)))
+        filters = p.get('filters')
+        if filters is not None and not isinstance(filters, list):
             raise PolicyValidationError((
                 'policy:%s must use a list for filters found:%s' % (
-                    p['name'], type(p['filters']).__name__)))
-        element_types = (dict, str)
-        for f in p.get('filters', ()):
-            if not isinstance(f, element_types):
+                    p['name'], type(filters).__name__)))
+        for f in filters or ():
+            if not isinstance(f, ELEMENT_TYPES):
                 raise PolicyValidationError((
                     'policy:%s filter must be a mapping/dict found:%s' % (
-                        p.get('name', 'unknown'), type(f).__name__)))
-        if not isinstance(p.get('actions', []), (list, type(None))):
+                        p['name'], type(f).__name__)))
+        actions = p.get('actions')
+        if actions is not None and not isinstance(actions, list):
             raise PolicyValidationError((
                 'policy:%s must use a list for actions found:%s' % (
-                    p.get('name', 'unknown'), type(p['actions']).__name__)))
-        for a in p.get('actions', ()):
-            if not isinstance(a, element_types):
+                    p['name'], type(actions).__name__)))
+        for a in actions or ():
+            if not isinstance(a, ELEMENT_TYPES):
                 raise PolicyValidationError((
                     'policy:%s action must be a mapping/dict found:%s' % (
-                        p.get('name', 'unknown'), type(a).__name__)))
+                        p['name'], type(a).__name__)))
 
     def get_resource_types(self, data):
         resources = set()
+        add = resources.add
         for p in data.get('policies', []):
             rtype = p['resource']
-            if '.' not in rtype:
-                rtype = 'aws.%s' % rtype
-            resources.add(rtype)
+            add(intern(rtype if '.' in rtype else AWS_PREFIX + rtype))
         return resources
@@ -34,6 +34,12 @@ else:
     except ImportError:  # pragma: no cover
         from yaml import SafeLoader, SafeDumper as BaseSafeDumper
 
+try:
+    # optional faster json parser for loading policy files.
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 
 class SafeDumper(BaseSafeDumper or object):
     def ignore_aliases(self, data):
@@ -54,6 +60,16 @@ def load_file(path, format=None, vars=None):
         if ext[1:] == 'json':
             format = 'json'
 
+    if not vars:
+        # without variable substitution, hand bytes straight to the
+        # parser and skip decoding the file into an intermediate string.
+        with open(path, 'rb') as fh:
+            if format == 'yaml':
+                return yaml_load(fh)
+            elif format == 'json':
+                return json_load_bytes(fh.read())
+        return
+
     with open(path) as fh:
         contents = fh.read()
 
@@ -89,6 +105,17 @@ def loads(body):
     return json.loads(body)
 
 
+def json_load_bytes(body):
+    if orjson is not None:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # stdlib accepts a few extensions (NaN, big ints, byte order
+            # marks) and has the error messages users expect.
+            pass
+    return loads(body)
+
+
 def dumps(data, fh=None, indent=0):
     if fh:
         return json.dump(data, fh, cls=DateTimeEncoder, indent=indent)
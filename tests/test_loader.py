@@ -1,10 +1,18 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
+import os
 from os import path
 import tempfile
 from textwrap import dedent
 
+import mock
+import pytest
+
 from c7n import loader
+from c7n.config import Config
+from c7n.exceptions import PolicyValidationError
+from c7n.executor import MainThreadExecutor
+from c7n.resources import load_resources
 from .common import BaseTest
 
 
@@ -28,3 +36,174 @@ class TestSourceLocator(BaseTest):
             self.assertEqual(locator.find("foo"), "testfile.yaml:2")
             self.assertEqual(locator.find("bar"), "testfile.yaml:7")
             self.assertEqual(locator.find("non-existent"), "")
+
+    def test_empty_and_crlf_file(self):
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            filename = path.join(tmpdirname, "empty.yaml")
+            open(filename, "w").close()
+            self.assertEqual(loader.SourceLocator(filename).find("foo"), "")
+
+            filename = path.join(tmpdirname, "crlf.yaml")
+            with open(filename, "wb") as f:
+                f.write(b"policies:\r\n\r\n  - name: foo\r\n    resource: s3\r\n"
+                        b"  - resource: ec2\r\n    name: bar  \r\n")
+            locator = loader.SourceLocator(filename)
+            self.assertEqual(locator.find("foo"), "crlf.yaml:3")
+            self.assertEqual(locator.find("bar"), "crlf.yaml:6")
+
+
+class TestSourceIndex(BaseTest):
+
+    def test_multiple_files(self):
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            first = path.join(tmpdirname, "first.yaml")
+            with open(first, "w") as f:
+                f.write(dedent("""\
+                    policies:
+                      - name: foo
+                        resource: s3
+                    """))
+            second = path.join(tmpdirname, "second.yml")
+            with open(second, "w") as f:
+                f.write(dedent("""\
+                    policies:
+                      - name: bar
+                        resource: ec2
+                      - name: foo
+                        resource: ec2
+                    """))
+            index = loader.SourceIndex([first, second])
+            self.assertEqual(index.find("foo"), "first.yaml:2")
+            self.assertEqual(index.find("bar"), "second.yml:2")
+            self.assertEqual(index.find("non-existent"), "")
+
+
+@pytest.mark.skipif(loader.fastjsonschema is None, reason="fastjsonschema not installed")
+class TestFastSchemaValidator(BaseTest):
+
+    def test_fast_validate(self):
+        load_resources(('aws.s3',))
+        self.patch(loader.SchemaValidator, 'fast_validate', True)
+        validator = loader.SchemaValidator()
+        self.assertEqual(validator.validate({
+            'policies': [{
+                'name': 'foo', 'resource': 'aws.s3', 'actions': ['delete']}]}), [])
+        self.assertIsNotNone(validator.fast_validator)
+        errors = validator.validate({
+            'policies': [{
+                'name': 'foo', 'resource': 'aws.s3', 'actions': [{'type': 'bogus'}]}]})
+        self.assertEqual(errors[1], 'foo')
+
+    def test_fast_validate_compile_fallback(self):
+        load_resources(('aws.s3',))
+        self.patch(loader.SchemaValidator, 'fast_validate', True)
+        loader._gen_fast_schema.cache_clear()
+        self.addCleanup(loader._gen_fast_schema.cache_clear)
+        validator = loader.SchemaValidator()
+        with mock.patch.object(
+                loader.fastjsonschema, 'compile',
+                side_effect=loader.fastjsonschema.JsonSchemaDefinitionException('bad')):
+            self.assertEqual(validator.validate({
+                'policies': [{
+                    'name': 'foo', 'resource': 'aws.s3', 'actions': ['delete']}]}), [])
+            self.assertIsNone(validator.fast_validator)
+            errors = validator.validate({
+                'policies': [{
+                    'name': 'foo', 'resource': 'aws.s3', 'actions': [{'type': 'bogus'}]}]})
+        self.assertEqual(errors[1], 'foo')
+
+
+class TestPolicyLoader(BaseTest):
+
+    def test_load_data_seen_types(self):
+        # the collection built by load_data needs the resource registered.
+        load_resources(('aws.s3',))
+        policy_loader = loader.PolicyLoader(Config.empty())
+        data = {'policies': [{'name': 'foo', 'resource': 'aws.s3'}]}
+        with mock.patch('c7n.loader.load_resources', return_value=[]) as load:
+            policy_loader.load_data(data, 'memory://', validate=False)
+            policy_loader.load_data(data, 'memory://', validate=False)
+        load.assert_called_once_with(['aws.s3'])
+        self.assertEqual(policy_loader.seen_types, {'aws.s3'})
+
+    def write_policy_files(self, tmpdirname, policies):
+        paths = []
+        for name, resource, actions in policies:
+            paths.append(path.join(tmpdirname, "%s.yml" % name))
+            with open(paths[-1], "w") as f:
+                f.write(dedent("""\
+                    policies:
+                      - name: %s
+                        resource: %s
+                        actions: %s
+                    """ % (name, resource, actions)))
+        return paths
+
+    def test_load_files(self):
+        self.patch(loader, 'ProcessPoolExecutor', MainThreadExecutor)
+        policy_loader = loader.PolicyLoader(Config.empty())
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            paths = self.write_policy_files(tmpdirname, (
+                ('foo', 'aws.s3', '[]'), ('bar', 'aws.sqs', '[]')))
+            collections = list(policy_loader.load_files(paths))
+            self.assertEqual(
+                [[p.name for p in c] for c in collections], [['foo'], ['bar']])
+
+            paths = self.write_policy_files(tmpdirname, (
+                ('bar', 'aws.sqs', '[bogus]'),))
+            with self.assertRaises(PolicyValidationError):
+                list(policy_loader.load_files(paths))
+
+    def test_load_files_process_pool(self):
+        # config, policy data and validation errors cross process boundaries.
+        policy_loader = loader.PolicyLoader(Config.empty(region='us-east-1'))
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            paths = self.write_policy_files(tmpdirname, (
+                ('foo', 'aws.s3', '[delete]'), ('bar', 'aws.sqs', '[bogus]')))
+            results = policy_loader.load_files(paths, max_workers=2)
+            collection = next(results)
+            self.assertEqual([p.name for p in collection], ['foo'])
+            with self.assertRaises(PolicyValidationError) as ecm:
+                next(results)
+            self.assertIn('Failed to validate policy bar', str(ecm.exception))
+
+
+class TestSchemaCache(BaseTest):
+
+    def test_schema_cache(self):
+        load_resources(('aws.s3',))
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            self.patch(loader.SchemaValidator, 'schema_cache', True)
+            self.patch(loader.SchemaValidator, 'schema_cache_dir', tmpdirname)
+            data = {'policies': [{
+                'name': 'foo', 'resource': 'aws.s3', 'actions': [{'type': 'bogus'}]}]}
+
+            validator = loader.SchemaValidator()
+            self.assertEqual(validator.validate(data)[1], 'foo')
+            cache_path = loader._schema_cache_path(tmpdirname, ('aws.s3',))
+            self.assertTrue(path.exists(cache_path))
+
+            loader._gen_schema.cache_clear()
+            with mock.patch('c7n.schema.generate') as generate:
+                validator = loader.SchemaValidator()
+                self.assertEqual(validator.validate(data)[1], 'foo')
+            generate.assert_not_called()
+
+    def test_schema_cache_write_failure(self):
+        load_resources(('aws.s3',))
+        loader._gen_schema.cache_clear()
+        self.addCleanup(loader._gen_schema.cache_clear)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            self.patch(loader.SchemaValidator, 'schema_cache', True)
+            self.patch(loader.SchemaValidator, 'schema_cache_dir', tmpdirname)
+            with mock.patch('c7n.loader.json.dump', side_effect=OSError('disk full')):
+                validator = loader.SchemaValidator()
+                self.assertEqual(validator.validate({'policies': [{
+                    'name': 'foo', 'resource': 'aws.s3', 'actions': ['delete']}]}), [])
+            self.assertEqual(os.listdir(tmpdirname), [])
+
+            # non json values in a schema skip caching rather than failing.
+            loader._save_cached_schema(tmpdirname, ('aws.s3',), {'a': {1, 2}})
+            self.assertEqual(os.listdir(tmpdirname), [])
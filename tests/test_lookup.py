@@ -46,6 +46,17 @@ class LookupTest(BaseTest):
         value = Lookup.extract(source, data)
         self.assertEqual(value, 'value_1')
 
+    def test_extract_lookup_default(self):
+        source = {
+            'type': Lookup.RESOURCE_SOURCE,
+            'key': 'field_level_1.field_level_2',
+            'default-value': 'value_2'
+        }
+        self.assertEqual(Lookup.extract(source, {}), 'value_2')
+        source.pop('default-value')
+        with self.assertRaises(Exception):
+            Lookup.extract(source, {})
+
     def test_get_value_from_resource_value_exists(self):
         resource = {
             'field_level_1': {
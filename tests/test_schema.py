@@ -86,12 +86,18 @@ class StructureParserTest(BaseTest):
         self.assertTrue(str(ecm.exception).startswith(
             'policy:foo filter must be a mapping/dict found:list'))
 
+    def test_null_filters_actions(self):
+        p = StructureParser()
+        p.validate({'policies': [{
+            'name': 'foo', 'resource': 'ec2', 'filters': None, 'actions': None}]})
+
     def test_policy_not_mapping(self):
         p = StructureParser()
         with self.assertRaises(PolicyValidationError) as ecm:
             p.validate({'policies': [[]]})
         self.assertTrue(str(ecm.exception).startswith(
             'policy must be a dictionary/mapping found:list'))
+        self.assertIsInstance(ecm.exception.args[0], str)
 
     def test_get_resource_types(self):
         p = StructureParser()
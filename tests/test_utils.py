@@ -485,6 +485,13 @@ class UtilTest(BaseTest):
         data = utils.load_file(json_file)
         self.assertTrue(data["InstanceId"] == "i-1aebf7c0")
 
+    def test_json_load_bytes(self):
+        self.assertEqual(utils.json_load_bytes(b'{"a": [1, 2]}'), {"a": [1, 2]})
+        # extended syntax falls back to the stdlib parser
+        self.assertEqual(utils.json_load_bytes(b'{"a": 2e400}'), {"a": float('inf')})
+        self.assertEqual(utils.json_load_bytes(b'\xef\xbb\xbf{"a": 1}'), {"a": 1})
+        self.assertRaises(ValueError, utils.json_load_bytes, b'{"a":')
+
     def test_format_string_values(self):
         obj = {
             "Key1": "Value1",